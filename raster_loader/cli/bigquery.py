@@ -46,6 +46,31 @@ def bigquery(args=None):
     default=False,
     is_flag=True,
 )
+@click.option(
+    "--use_storage_write_api",
+    help=(
+        "Append the records with the BigQuery Storage Write API instead of load "
+        "jobs (requires google-cloud-bigquery-storage)."
+    ),
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--compress",
+    help="Compress the block values with Blosc2 (requires blosc2).",
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--max_workers",
+    help="The number of threads reading raster blocks concurrently.",
+    default=1,
+)
+@click.option(
+    "--io_chunk",
+    help="Read the raster by chunks of io_chunk x io_chunk blocks.",
+    default=1,
+)
 @click.option("--test", help="Use Mock BigQuery Client", default=False, is_flag=True)
 def upload(
     file_path,
@@ -57,6 +82,10 @@ def upload(
     input_crs,
     overwrite=False,
     output_quadbin=False,
+    use_storage_write_api=False,
+    compress=False,
+    max_workers=1,
+    io_chunk=1,
     test=False,
 ):
 
@@ -97,6 +126,8 @@ def upload(
     click.echo("Table: {}".format(table))
     click.echo("Number of Records Per BigQuery Append: {}".format(chunk_size))
     click.echo("Input CRS: {}".format(input_crs))
+    click.echo("Number of Reading Threads: {}".format(max_workers))
+    click.echo("Blocks Per Read: {0} x {0}".format(io_chunk))
 
     click.echo("Uploading Raster to BigQuery")
 
@@ -111,6 +142,10 @@ def upload(
         client=client,
         overwrite=overwrite,
         output_quadbin=output_quadbin,
+        max_workers=max_workers,
+        use_storage_write_api=use_storage_write_api,
+        compress=compress,
+        io_chunk=io_chunk,
     )
 
     click.echo("Raster file uploaded to Google BigQuery")
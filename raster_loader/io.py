@@ -1,11 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from io import BytesIO
 import json
+import math
 import sys
-from itertools import islice
+import threading
+from itertools import chain, islice, repeat
 from typing import Iterable
 
 from affine import Affine
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import pyproj
 
 try:
@@ -17,6 +26,7 @@ else:
 
 try:
     import rasterio
+    from rasterio.windows import Window
 except ImportError:  # pragma: no cover
     _has_rasterio = False
 else:
@@ -36,10 +46,59 @@ except ImportError:  # pragma: no cover
 else:
     _has_bigquery = True
 
+try:
+    import blosc2
+except ImportError:  # pragma: no cover
+    _has_blosc2 = False
+else:
+    _has_blosc2 = True
+
+try:
+    from google.cloud import bigquery_storage_v1
+    from google.cloud.bigquery_storage_v1 import types as bigquery_storage_types
+    from google.cloud.bigquery_storage_v1 import writer as bigquery_storage_writer
+except ImportError:  # pragma: no cover
+    _has_bigquery_storage = False
+else:
+    _has_bigquery_storage = True
+
 from raster_loader.utils import ask_yes_no_question
 
 should_swap = {"=": sys.byteorder != "little", "<": False, ">": True, "|": False}
 
+# default number of blocks per record batch
+RECORD_BATCH_SIZE = 1024
+
+# compression of the block values stored in the attrs of compressed records
+BLOSC2_COMPRESSION = "blosc2-zstd"
+
+# arrow types of the record columns, besides the (large binary) value field
+RECORD_ARROW_TYPES = {
+    "lat_NW": pa.float64(),
+    "lon_NW": pa.float64(),
+    "lat_NE": pa.float64(),
+    "lon_NE": pa.float64(),
+    "lat_SE": pa.float64(),
+    "lon_SE": pa.float64(),
+    "lat_SW": pa.float64(),
+    "lon_SW": pa.float64(),
+    "quadbin": pa.int64(),
+    "block_height": pa.int64(),
+    "block_width": pa.int64(),
+    "attrs": pa.string(),
+}
+
+# BigQuery types of the arrow record column types
+BIGQUERY_TYPES = {
+    pa.float64(): "FLOAT64",
+    pa.int64(): "INT64",
+    pa.string(): "STRING",
+    pa.large_binary(): "BYTES",
+}
+
+# max size of a Storage Write API append request (the API limit is 10 MB)
+STORAGE_WRITE_MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
 
 def batched(iterable, n):
     "Batch data into tuples of length n. The last batch may be shorter."
@@ -51,6 +110,211 @@ def batched(iterable, n):
         yield batch
 
 
+@lru_cache(maxsize=256)
+def get_transformer(src_crs: str, dst_crs: str = "EPSG:4326") -> pyproj.Transformer:
+    """Get a (cached) transformer between two CRSs.
+
+    Building a ``pyproj.Transformer`` is expensive, so transformers are cached
+    by ``(src_crs, dst_crs)``. Axis order is always (x, y), i.e. (lon, lat).
+    """
+    return pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+@lru_cache(maxsize=256)
+def attrs_template(
+    band: int,
+    value_field: str,
+    dtype: str,
+    crs: str,
+    gdal_transform: tuple,
+    compression: str = None,
+) -> str:
+    """Get the JSON attrs of a block, with ``%d`` placeholders for its offsets.
+
+    Only the block offsets change from block to block, so the rest of the attrs
+    is serialized once per raster band.
+    """
+    attrs = {
+        "band": band,
+        "value_field": value_field,
+        "dtype": dtype,
+        "crs": crs,
+        "gdal_transform": gdal_transform,
+    }
+    if compression is not None:
+        attrs["compression"] = compression
+    # escape any % in the serialized attrs (e.g. in a WKT crs) for formatting
+    prefix = json.dumps(attrs)[:-1].replace("%", "%%")
+    return prefix + ', "row_off": %d, "col_off": %d}'
+
+
+def array_to_buffer(arr: np.ndarray) -> memoryview:
+    """Get the little endian bytes of an array without copying them.
+
+    The returned memoryview references the array data, which is only copied
+    if the array must be byteswapped or is not C-contiguous.
+    """
+    if should_swap[arr.dtype.byteorder]:
+        arr = arr.byteswap()
+
+    return memoryview(np.ascontiguousarray(arr)).cast("B")
+
+
+def compress_buffer(buffer: memoryview, typesize: int) -> bytes:
+    """Compress the bytes of a block with Blosc2 (Zstd codec, shuffle filter).
+
+    Requires blosc2.
+    """
+    if not _has_blosc2:  # pragma: no cover
+        import_error_blosc2()
+
+    return blosc2.compress2(
+        buffer, codec=blosc2.Codec.ZSTD, clevel=3, typesize=typesize
+    )
+
+
+def blocks_corners(
+    transformer: pyproj.Transformer,
+    geotransform: Affine,
+    row_offs: Iterable,
+    col_offs: Iterable,
+    heights: Iterable,
+    widths: Iterable,
+) -> tuple:
+    """Compute the reprojected corners of a set of blocks.
+
+    The corners of all blocks are reprojected in a single transform call.
+
+    Returns
+    -------
+    tuple
+        ``(lons, lats)`` arrays of shape ``(n_blocks, 4)``, with corners in
+        NW, NE, SE, SW order.
+    """
+    row_offs = np.asarray(row_offs, dtype=np.float64)
+    col_offs = np.asarray(col_offs, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    widths = np.asarray(widths, dtype=np.float64)
+
+    cols = np.stack([col_offs, col_offs + widths, col_offs + widths, col_offs], axis=1)
+    rows = np.stack(
+        [row_offs, row_offs, row_offs + heights, row_offs + heights], axis=1
+    )
+
+    # apply the affine coefficients to all corners at once
+    a, b, c, d, e, f = geotransform[:6]
+    xs = a * cols + b * rows + c
+    ys = d * cols + e * rows + f
+
+    lons, lats = transformer.transform(xs.ravel(), ys.ravel())
+
+    return np.reshape(lons, cols.shape), np.reshape(lats, rows.shape)
+
+
+def windows_grid(
+    height: int,
+    width: int,
+    window_height: int,
+    window_width: int,
+    row_off: int = 0,
+    col_off: int = 0,
+) -> tuple:
+    """Get the offsets and shapes of a grid of windows covering an extent.
+
+    Windows are in row major order, with edge windows clipped to the extent.
+
+    Returns
+    -------
+    tuple
+        ``(row_offs, col_offs, heights, widths)`` arrays of length ``n_windows``.
+    """
+    row_offs, col_offs = np.meshgrid(
+        np.arange(row_off, row_off + height, window_height),
+        np.arange(col_off, col_off + width, window_width),
+        indexing="ij",
+    )
+    row_offs, col_offs = row_offs.ravel(), col_offs.ravel()
+
+    heights = np.minimum(window_height, row_off + height - row_offs)
+    widths = np.minimum(window_width, col_off + width - col_offs)
+
+    return row_offs, col_offs, heights, widths
+
+
+def blocks_grid(raster_dataset, io_chunk: int = 1) -> tuple:
+    """Get the offsets and shapes of the blocks of a rasterio dataset.
+
+    Blocks are computed from the block shape, in the same (row major) order as
+    ``block_windows()``, with edge blocks clipped to the raster extent.
+
+    With ``io_chunk`` greater than 1 the blocks are grouped by chunks of
+    ``io_chunk`` x ``io_chunk`` blocks, see chunks_grid: chunks are in row major
+    order, and so are the blocks within each chunk.
+
+    Returns
+    -------
+    tuple
+        ``(row_offs, col_offs, heights, widths)`` arrays of length ``n_blocks``.
+    """
+    block_height, block_width = raster_dataset.block_shapes[0]
+
+    if io_chunk <= 1:
+        return windows_grid(
+            raster_dataset.height, raster_dataset.width, block_height, block_width
+        )
+
+    chunks = chunks_grid(raster_dataset, io_chunk)
+    grids = [
+        windows_grid(height, width, block_height, block_width, row_off, col_off)
+        for row_off, col_off, height, width in zip(*chunks)
+    ]
+
+    return tuple(np.concatenate(arrays) for arrays in zip(*grids))
+
+
+def chunks_grid(raster_dataset, io_chunk: int) -> tuple:
+    """Get the offsets and shapes of chunks of ``io_chunk`` x ``io_chunk`` blocks.
+
+    Chunks are in row major order, with edge chunks clipped to the raster extent.
+    """
+    block_height, block_width = raster_dataset.block_shapes[0]
+
+    return windows_grid(
+        raster_dataset.height,
+        raster_dataset.width,
+        block_height * io_chunk,
+        block_width * io_chunk,
+    )
+
+
+def blocks_quadbins(
+    transformer: pyproj.Transformer,
+    geotransform: Affine,
+    resolution: int,
+    row_offs: Iterable,
+    col_offs: Iterable,
+    heights: Iterable,
+    widths: Iterable,
+) -> list:
+    """Compute the quadbin cells of the centers of a set of blocks.
+
+    The centers of all blocks are reprojected in a single transform call.
+    """
+    if not _has_quadbin:  # pragma: no cover
+        import_error_quadbin()
+
+    cols = np.asarray(col_offs) + np.asarray(widths) * 0.5
+    rows = np.asarray(row_offs) + np.asarray(heights) * 0.5
+
+    a, b, c, d, e, f = geotransform[:6]
+    xs, ys = transformer.transform(a * cols + b * rows + c, d * cols + e * rows + f)
+
+    return [
+        quadbin.point_to_cell(x, y, resolution)
+        for x, y in zip(np.ravel(xs).tolist(), np.ravel(ys).tolist())
+    ]
+
+
 def array_to_record(
     arr: np.ndarray,
     transformer: pyproj.Transformer,
@@ -60,36 +324,37 @@ def array_to_record(
     value_field: str = "band_1",
     crs: str = "EPSG:4326",
     band: int = 1,
+    corners: tuple = None,
+    compress: bool = False,
 ) -> dict:
     height, width = arr.shape
 
-    lon_NW, lat_NW = transformer.transform(*(geotransform * (col_off, row_off)))
-    lon_NE, lat_NE = transformer.transform(*(geotransform * (col_off + width, row_off)))
-    lon_SE, lat_SE = transformer.transform(
-        *(geotransform * (col_off + width, row_off + height))
-    )
-    lon_SW, lat_SW = transformer.transform(
-        *(geotransform * (col_off, row_off + height))
-    )
+    # corners (lons, lats) in NW, NE, SE, SW order may be precomputed for a
+    # batch of blocks, see blocks_corners
+    if corners is None:
+        lons, lats = blocks_corners(
+            transformer, geotransform, [row_off], [col_off], [height], [width]
+        )
+        corners = (lons[0], lats[0])
+
+    lon_NW, lon_NE, lon_SE, lon_SW = corners[0].tolist()
+    lat_NW, lat_NE, lat_SE, lat_SW = corners[1].tolist()
 
     # required to append dtype to value field name for storage
     dtype_str = str(arr.dtype)
     value_field = "_".join([value_field, dtype_str])
 
-    attrs = {
-        "band": band,
-        "value_field": value_field,
-        "dtype": dtype_str,
-        "crs": crs,
-        "gdal_transform": geotransform.to_gdal(),
-        "row_off": row_off,
-        "col_off": col_off,
-    }
+    compression = BLOSC2_COMPRESSION if compress else None
+    attrs = attrs_template(
+        band, value_field, dtype_str, crs, geotransform.to_gdal(), compression
+    ) % (row_off, col_off)
 
-    if should_swap[arr.dtype.byteorder]:
-        arr_bytes = np.ascontiguousarray(arr.byteswap()).tobytes()
+    # records own their values (bytes), independent of later changes to arr
+    arr_bytes = array_to_buffer(arr)
+    if compress:
+        arr_bytes = compress_buffer(arr_bytes, arr.dtype.itemsize)
     else:
-        arr_bytes = np.ascontiguousarray(arr).tobytes()
+        arr_bytes = bytes(arr_bytes)
 
     record = {
         "lat_NW": lat_NW,
@@ -102,7 +367,7 @@ def array_to_record(
         "lon_SW": lon_SW,
         "block_height": height,
         "block_width": width,
-        "attrs": json.dumps(attrs),
+        "attrs": attrs,
         value_field: arr_bytes,
     }
 
@@ -119,6 +384,7 @@ def array_to_quadbin_record(
     value_field: str = "band_1",
     crs: str = "EPSG:4326",
     band: int = 1,
+    compress: bool = False,
 ) -> dict:
     """Requires quadbin."""
     if not _has_quadbin:  # pragma: no cover
@@ -134,55 +400,111 @@ def array_to_quadbin_record(
     dtype_str = str(arr.dtype)
     value_field = "_".join([value_field, dtype_str])
 
-    attrs = {
-        "band": band,
-        "value_field": value_field,
-        "dtype": dtype_str,
-        "crs": crs,
-        "gdal_transform": geotransform.to_gdal(),
-        "row_off": row_off,
-        "col_off": col_off,
-    }
+    compression = BLOSC2_COMPRESSION if compress else None
+    attrs = attrs_template(
+        band, value_field, dtype_str, crs, geotransform.to_gdal(), compression
+    ) % (row_off, col_off)
 
-    if should_swap[arr.dtype.byteorder]:
-        arr_bytes = np.ascontiguousarray(arr.byteswap()).tobytes()
+    # records own their values (bytes), independent of later changes to arr
+    arr_bytes = array_to_buffer(arr)
+    if compress:
+        arr_bytes = compress_buffer(arr_bytes, arr.dtype.itemsize)
     else:
-        arr_bytes = np.ascontiguousarray(arr).tobytes()
+        arr_bytes = bytes(arr_bytes)
 
     record = {
         "quadbin": quadbin.point_to_cell(x, y, resolution),
         "block_height": height,
         "block_width": width,
-        "attrs": json.dumps(attrs),
+        "attrs": attrs,
         value_field: arr_bytes,
     }
 
     return record
 
 
-def record_to_array(record: dict, value_field: str = None) -> np.ndarray:
-    """Convert a record to a numpy array."""
-
-    if value_field is None:
-        value_field = json.loads(record["attrs"])["value_field"]
-
-    # determine dtype
+@lru_cache(maxsize=None)
+def attrs_dtype(dtype_str: str) -> np.dtype:
+    """Get the dtype of the (little endian) values of a record from its attrs."""
     try:
-        dtype_str = value_field.split("_")[-1]
         dtype = np.dtype(dtype_str)
         dtype = dtype.newbyteorder("<")
     except TypeError:
         raise TypeError(f"Invalid dtype: {dtype_str}")
 
+    return dtype
+
+
+def record_to_array(
+    record: dict,
+    value_field: str = None,
+    copy: bool = False,
+    attrs: dict = None,
+    dtype: str = None,
+    compression: str = None,
+) -> np.ndarray:
+    """Convert a record to a numpy array.
+
+    The value field, dtype and compression are read from the record attrs,
+    unless ``attrs`` is given already parsed (e.g. shared by all records of a
+    band). The attrs are not parsed at all when both ``value_field`` and
+    ``dtype`` are given, in which case ``compression`` must also be given for
+    compressed values (None means uncompressed).
+    By default the array is a read-only view of the record value, set ``copy``
+    to get a writable array.
+    """
+
+    if attrs is None and (value_field is None or dtype is None):
+        attrs = json.loads(record["attrs"])
+
+    if attrs is not None:
+        value_field = value_field or attrs["value_field"]
+        dtype = dtype or attrs["dtype"]
+        compression = compression or attrs.get("compression")
+
+    # determine dtype
+    dtype = attrs_dtype(dtype)
+
     # determine shape
     shape = (record["block_height"], record["block_width"])
 
-    arr = np.frombuffer(record[value_field], dtype=dtype)
+    value = record[value_field]
+    if compression == BLOSC2_COMPRESSION:
+        if not _has_blosc2:  # pragma: no cover
+            import_error_blosc2()
+        value = blosc2.decompress2(value)
+    elif compression is not None:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    arr = np.frombuffer(value, dtype=dtype)
     arr = arr.reshape(shape)
 
+    if copy:
+        arr = arr.copy()
+
     return arr
 
 
+def records_to_arrays(
+    records: Iterable, value_field: str = None, copy: bool = False
+) -> list:
+    """Convert records of the same raster band to numpy arrays.
+
+    All records of a band share their value field, dtype and compression, so
+    the attrs are parsed only once, from the first record.
+    """
+    records = list(records)
+
+    if not records:
+        return []
+
+    attrs = json.loads(records[0]["attrs"])
+
+    return [
+        record_to_array(record, value_field, copy, attrs=attrs) for record in records
+    ]
+
+
 def import_error_bigquery():  # pragma: no cover
     msg = (
         "Google Cloud BigQuery is not installed.\n"
@@ -194,6 +516,28 @@ def import_error_bigquery():  # pragma: no cover
     raise ImportError(msg)
 
 
+def import_error_bigquery_storage():  # pragma: no cover
+    msg = (
+        "Google Cloud BigQuery Storage is not installed.\n"
+        "Please install Google Cloud BigQuery Storage to use this function.\n"
+        "See https://cloud.google.com/python/docs/reference/bigquerystorage/latest\n"
+        "for installation instructions.\n"
+        "OR, run `pip install google-cloud-bigquery-storage` to install from pypi."
+    )
+    raise ImportError(msg)
+
+
+def import_error_blosc2():  # pragma: no cover
+    msg = (
+        "Blosc2 is not installed.\n"
+        "Please install python-blosc2 to use this function.\n"
+        "See https://www.blosc.org/python-blosc2/\n"
+        "for installation instructions.\n"
+        "Alternatively, run `pip install blosc2` to install from pypi."
+    )
+    raise ImportError(msg)
+
+
 def import_error_rasterio():  # pragma: no cover
     msg = (
         "Rasterio is not installed.\n"
@@ -227,9 +571,125 @@ def import_error_quadbin():  # pragma: no cover
     raise ImportError(msg)
 
 
-def rasterio_windows_to_records(
-    file_path: str, band: int = 1, input_crs: str = None, output_quadbin: bool = False
+def read_windows(
+    raster_dataset,
+    band: int,
+    windows: Iterable,
+    max_workers: int = 1,
+    outs: Iterable = None,
+) -> Iterable:
+    """Read a band of a rasterio dataset for each window, in order.
+
+    With ``max_workers`` greater than 1 the windows are read by a pool of threads,
+    each with its own handle on the raster file since rasterio datasets are not
+    thread safe. GDAL releases the GIL while reading and decompressing blocks, so
+    the reads run concurrently.
+
+    ``outs`` optionally gives, for each window, a preallocated array of the
+    window shape to read into (or None to allocate a new array).
+    """
+    if outs is None:
+        outs = repeat(None)
+
+    if max_workers <= 1:
+        for window, out in zip(windows, outs):
+            yield raster_dataset.read(band, window=window, out=out)
+        return
+
+    local = threading.local()
+    datasets = []
+
+    def read(window, out):
+        if not hasattr(local, "dataset"):
+            local.dataset = rasterio.open(raster_dataset.name)
+            datasets.append(local.dataset)
+        return local.dataset.read(band, window=window, out=out)
+
+    try:
+        with ThreadPoolExecutor(max_workers) as executor:
+            # bound the number of blocks read ahead and held in memory
+            for windows_batch in batched(zip(windows, outs), 4 * max_workers):
+                yield from executor.map(read, *zip(*windows_batch))
+    finally:
+        for dataset in datasets:
+            dataset.close()
+
+
+def blocks_buffers(
+    heights: np.ndarray, widths: np.ndarray, block_shape: tuple, dtype, batch_size: int
+) -> Iterable:
+    """Get preallocated arrays to read the blocks of a raster into.
+
+    Yields a C-contiguous ``block_shape`` array for each full block and None for
+    the (smaller) edge blocks. The arrays of a batch of blocks are slices of a
+    single buffer, allocated lazily. Buffers are never reused, since the values
+    of a batch reference them until the batch is built.
+    """
+    block_shape = tuple(block_shape)
+
+    for start in range(0, len(heights), batch_size):
+        blocks = slice(start, start + batch_size)
+        shapes = list(zip(heights[blocks].tolist(), widths[blocks].tolist()))
+        buffer = np.empty((len(shapes),) + block_shape, dtype=dtype)
+
+        for out, shape in zip(buffer, shapes):
+            yield out if shape == block_shape else None
+
+
+def read_chunks(
+    raster_dataset,
+    band: int,
+    io_chunk: int,
+    max_workers: int = 1,
+) -> Iterable:
+    """Read a band of a rasterio dataset by chunks of blocks, one block at a time.
+
+    Each chunk of ``io_chunk`` x ``io_chunk`` blocks is read in a single window
+    and sliced in memory into its blocks, which are yielded in the order of
+    ``blocks_grid(raster_dataset, io_chunk)``. This trades fewer (larger) reads
+    for ``io_chunk ** 2`` times the memory per read.
+    """
+    block_height, block_width = raster_dataset.block_shapes[0]
+    chunks = [grid.tolist() for grid in chunks_grid(raster_dataset, io_chunk)]
+
+    windows = (
+        Window(col_off, row_off, width, height)
+        for row_off, col_off, height, width in zip(*chunks)
+    )
+    arrays = read_windows(raster_dataset, band, windows, max_workers)
+
+    for chunk_height, chunk_width, arr in zip(chunks[2], chunks[3], arrays):
+        # offsets of the blocks relative to the chunk
+        blocks = windows_grid(chunk_height, chunk_width, block_height, block_width)
+        for row_off, col_off, height, width in zip(*[b.tolist() for b in blocks]):
+            yield arr[row_off : row_off + height, col_off : col_off + width]
+
+
+def rasterio_windows_to_record_batches(
+    file_path: str,
+    band: int = 1,
+    input_crs: str = None,
+    output_quadbin: bool = False,
+    max_workers: int = 1,
+    batch_size: int = RECORD_BATCH_SIZE,
+    compress: bool = False,
+    io_chunk: int = 1,
+    raster_dataset=None,
 ) -> Iterable:
+    """Read the blocks of a raster band into pyarrow.RecordBatch objects.
+
+    The columns of each batch of blocks are filled in place into preallocated
+    arrays (struct of arrays) instead of building a dict per block. The batches
+    hold the same columns as the records built by array_to_record, or by
+    array_to_quadbin_record if ``output_quadbin`` is set.
+
+    With ``io_chunk`` greater than 1 the blocks are read by chunks of
+    ``io_chunk`` x ``io_chunk`` blocks (see read_chunks). There is still one
+    record per block, but blocks come grouped by chunk instead of in row order.
+
+    ``raster_dataset`` optionally gives the rasterio dataset of ``file_path``
+    already open, which is then not opened (nor closed) again.
+    """
     if output_quadbin:
         """Open a raster file with rio-cogeo."""
         raster_info = rio_cogeo.cog_info(file_path).dict()
@@ -255,8 +715,13 @@ def rasterio_windows_to_records(
     if not _has_rasterio:  # pragma: no cover
         import_error_rasterio()
 
-    """Open a raster file with rasterio."""
-    with rasterio.open(file_path) as raster_dataset:
+    """Open a raster file with rasterio, unless it is already open."""
+    if raster_dataset is None:
+        raster_dataset = rasterio.open(file_path)
+    else:
+        raster_dataset = nullcontext(raster_dataset)
+
+    with raster_dataset as raster_dataset:
 
         raster_crs = raster_dataset.crs.to_string()
 
@@ -272,42 +737,152 @@ def rasterio_windows_to_records(
             err = rasterio.errors.CRSError(msg)
             raise err
 
-        transformer = pyproj.Transformer.from_crs(
-            input_crs, "EPSG:4326", always_xy=True
+        transformer = get_transformer(input_crs, "EPSG:4326")
+        geotransform = raster_dataset.transform
+
+        # required to append dtype to value field name for storage
+        dtype_str = raster_dataset.dtypes[band - 1]
+        value_field = "_".join(["band_1", dtype_str])
+        template = attrs_template(
+            band,
+            value_field,
+            dtype_str,
+            input_crs,
+            geotransform.to_gdal(),
+            BLOSC2_COMPRESSION if compress else None,
         )
+        itemsize = np.dtype(dtype_str).itemsize
+
+        # compute the geometry of all blocks up front, in a few vectorized calls
+        row_offs, col_offs, heights, widths = blocks_grid(raster_dataset, io_chunk)
+
+        if output_quadbin:
+            quadbins = blocks_quadbins(
+                transformer,
+                geotransform,
+                resolution,
+                row_offs,
+                col_offs,
+                heights,
+                widths,
+            )
+        else:
+            lons, lats = blocks_corners(
+                transformer, geotransform, row_offs, col_offs, heights, widths
+            )
 
-        for _, window in raster_dataset.block_windows():
-
-            if output_quadbin:
-                rec = array_to_quadbin_record(
-                    raster_dataset.read(band, window=window),
-                    transformer,
-                    raster_dataset.transform,
-                    resolution,
-                    window.row_off,
-                    window.col_off,
-                    crs=input_crs,
-                    band=band,
+        if io_chunk > 1:
+            arrays = read_chunks(raster_dataset, band, io_chunk, max_workers)
+        else:
+            windows = (
+                Window(col_off, row_off, width, height)
+                for row_off, col_off, height, width in zip(
+                    row_offs.tolist(),
+                    col_offs.tolist(),
+                    heights.tolist(),
+                    widths.tolist(),
                 )
+            )
+            # read full blocks into one preallocated buffer per batch
+            outs = blocks_buffers(
+                heights, widths, raster_dataset.block_shapes[0], dtype_str, batch_size
+            )
+            arrays = read_windows(raster_dataset, band, windows, max_workers, outs)
 
+        for start in range(0, len(row_offs), batch_size):
+            blocks = slice(start, start + batch_size)
+
+            if output_quadbin:
+                columns = {"quadbin": quadbins[blocks]}
             else:
-                rec = array_to_record(
-                    raster_dataset.read(band, window=window),
-                    transformer,
-                    raster_dataset.transform,
-                    window.row_off,
-                    window.col_off,
-                    crs=input_crs,
-                    band=band,
-                )
+                columns = {}
+                for j, corner in enumerate(["NW", "NE", "SE", "SW"]):
+                    columns[f"lat_{corner}"] = lats[blocks, j]
+                    columns[f"lon_{corner}"] = lons[blocks, j]
+
+            columns["block_height"] = heights[blocks]
+            columns["block_width"] = widths[blocks]
+            columns["attrs"] = [
+                template % offsets
+                for offsets in zip(row_offs[blocks].tolist(), col_offs[blocks].tolist())
+            ]
+            values = [
+                array_to_buffer(arr) for arr in islice(arrays, len(columns["attrs"]))
+            ]
+            if compress:
+                values = [compress_buffer(value, itemsize) for value in values]
+            columns[value_field] = values
+
+            yield columns_to_record_batch(columns, value_field)
+
+
+def rasterio_windows_to_records(
+    file_path: str,
+    band: int = 1,
+    input_crs: str = None,
+    output_quadbin: bool = False,
+    max_workers: int = 1,
+    compress: bool = False,
+    io_chunk: int = 1,
+) -> Iterable:
+    """Read the blocks of a raster band as records (dicts), one per block."""
+    for batch in rasterio_windows_to_record_batches(
+        file_path,
+        band,
+        input_crs,
+        output_quadbin,
+        max_workers,
+        compress=compress,
+        io_chunk=io_chunk,
+    ):
+        yield from batch.to_pylist()
+
+
+def columns_to_record_batch(columns: dict, value_field: str = None) -> pa.RecordBatch:
+    """Convert record columns to a pyarrow.RecordBatch.
+
+    The record columns and the ``value_field`` column are converted one at a time
+    with explicit types, so no per-row type inference is needed. The type of any
+    other column is inferred from its values.
+    """
+    types = dict(RECORD_ARROW_TYPES)
+    if value_field is not None:
+        types[value_field] = pa.large_binary()
+
+    arrays = [
+        pa.array(values, type=types.get(name)) for name, values in columns.items()
+    ]
+
+    return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+
+def records_to_record_batch(records: Iterable) -> pa.RecordBatch:
+    """Convert records to a columnar pyarrow.RecordBatch.
+
+    No records give an empty batch, without columns.
+    """
+    records = list(records)
 
-            yield rec
+    if not records:
+        return pa.RecordBatch.from_pydict({})
+
+    value_field = None
+    if "attrs" in records[0]:
+        value_field = json.loads(records[0]["attrs"]).get("value_field")
+
+    return columns_to_record_batch(
+        {name: [record[name] for record in records] for name in records[0]},
+        value_field,
+    )
 
 
 def records_to_bigquery(
     records: Iterable, table_id: str, dataset_id: str, project_id: str, client=None
 ):
-    """Write a record to a BigQuery table."""
+    """Write records to a BigQuery table.
+
+    Records can be given as dicts, or as a pyarrow.RecordBatch or pyarrow.Table.
+    """
 
     """Requires bigquery."""
     if not _has_bigquery:  # pragma: no cover
@@ -316,21 +891,179 @@ def records_to_bigquery(
     if client is None:  # pragma: no cover
         client = bigquery.Client(project=project_id)
 
-    records = list(records)
+    if isinstance(records, pa.RecordBatch):
+        records = pa.Table.from_batches([records])
+    elif not isinstance(records, pa.Table):
+        records = pa.Table.from_batches([records_to_record_batch(records)])
 
-    data_df = pd.DataFrame(records)
+    # write the records to Parquet with pyarrow directly, bypassing pandas
+    data_file = BytesIO()
+    pq.write_table(records, data_file)
 
-    job_config = bigquery.LoadJobConfig()
+    job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET)
 
-    if "quadbin" in data_df.keys():
+    if "quadbin" in records.schema.names:
         # Cluster table by quadbin
         job_config.clustering_fields = ["quadbin"]
 
-    return client.load_table_from_dataframe(
-        data_df, f"{project_id}.{dataset_id}.{table_id}", job_config=job_config
+    return client.load_table_from_file(
+        data_file,
+        f"{project_id}.{dataset_id}.{table_id}",
+        rewind=True,
+        job_config=job_config,
     )
 
 
+def record_batch_rows_nbytes(batch: pa.RecordBatch) -> np.ndarray:
+    """Get the size in bytes of each row of a record batch.
+
+    Fixed width columns count their width, variable size (binary and string)
+    columns the length of each value plus its offset.
+    """
+    nbytes = np.zeros(batch.num_rows, dtype=np.int64)
+
+    for column in batch.columns:
+        try:
+            nbytes += column.type.bit_width // 8
+        except ValueError:
+            lengths = pc.binary_length(column).fill_null(0)
+            nbytes += lengths.to_numpy(zero_copy_only=False) + 8
+
+    return nbytes
+
+
+def split_record_batch(batch: pa.RecordBatch, max_bytes: int) -> Iterable:
+    """Split a record batch into slices of at most ``max_bytes`` (approximately).
+
+    Slices are cut on the cumulative size of the rows, so that rows of uneven
+    size (e.g. compressed values) do not overflow a slice.
+    """
+    if batch.num_rows == 0 or batch.nbytes <= max_bytes:
+        yield batch
+        return
+
+    rows_nbytes = record_batch_rows_nbytes(batch)
+    if rows_nbytes.max() > max_bytes:
+        raise ValueError(
+            f"Record of {rows_nbytes.max()} bytes exceeds the maximum of "
+            f"{max_bytes} bytes."
+        )
+
+    cumulative_nbytes = np.cumsum(rows_nbytes)
+    offset = 0
+    while offset < batch.num_rows:
+        start_nbytes = cumulative_nbytes[offset - 1] if offset else 0
+        end = np.searchsorted(cumulative_nbytes, start_nbytes + max_bytes, "right")
+        yield batch.slice(offset, end - offset)
+        offset = int(end)
+
+
+def record_batches_to_bigquery_storage(
+    batches: Iterable,
+    table_id: str,
+    dataset_id: str,
+    project_id: str,
+    client=None,
+    write_client=None,
+) -> bool:
+    """Append record batches to a BigQuery table with the Storage Write API.
+
+    Unlike load jobs, appends to the table's default stream are not subject to the
+    daily quota of load jobs per table, and the batches are sent in Arrow format
+    without going through pandas. The table is created from the schema of the
+    first batch if it does not exist yet.
+
+    Parameters
+    ----------
+    batches : Iterable
+        pyarrow.RecordBatch objects, e.g. from records_to_record_batch.
+    table_id : str
+        BigQuery table name.
+    dataset_id : str
+        BigQuery dataset name.
+    project_id : str
+        BigQuery project name.
+    client : google.cloud.bigquery.client.Client, optional
+        BigQuery client, by default None
+    write_client : google.cloud.bigquery_storage_v1.BigQueryWriteClient, optional
+        BigQuery Storage Write API client, by default None
+
+    Returns
+    -------
+    bool
+        True if the batches were appended.
+    """
+
+    """Requires bigquery and bigquery storage."""
+    if not _has_bigquery:  # pragma: no cover
+        import_error_bigquery()
+
+    if not _has_bigquery_storage:  # pragma: no cover
+        import_error_bigquery_storage()
+
+    if client is None:  # pragma: no cover
+        client = bigquery.Client(project=project_id)
+
+    if write_client is None:  # pragma: no cover
+        write_client = bigquery_storage_v1.BigQueryWriteClient()
+
+    batches = iter(batches)
+    first_batch = next(batches)
+
+    # the Storage Write API does not create tables
+    table = bigquery.Table(
+        f"{project_id}.{dataset_id}.{table_id}",
+        schema=[
+            bigquery.SchemaField(field.name, BIGQUERY_TYPES[field.type])
+            for field in first_batch.schema
+        ],
+    )
+    if "quadbin" in first_batch.schema.names:
+        # Cluster table by quadbin
+        table.clustering_fields = ["quadbin"]
+    client.create_table(table, exists_ok=True)
+
+    table_path = write_client.table_path(project_id, dataset_id, table_id)
+    request_template = bigquery_storage_types.AppendRowsRequest(
+        write_stream=f"{table_path}/streams/_default",
+        arrow_rows=bigquery_storage_types.AppendRowsRequest.ArrowData(
+            writer_schema=bigquery_storage_types.ArrowSchema(
+                serialized_schema=first_batch.schema.serialize().to_pybytes()
+            )
+        ),
+    )
+    stream = bigquery_storage_writer.AppendRowsStream(write_client, request_template)
+
+    try:
+        futures = []
+        for batch in chain([first_batch], batches):
+            # raise error if the previous batch went wrong (blocking call)
+            while futures:
+                futures.pop().result()
+
+            for request_batch in split_record_batch(
+                batch, STORAGE_WRITE_MAX_REQUEST_BYTES
+            ):
+                serialized_batch = request_batch.serialize().to_pybytes()
+                request = bigquery_storage_types.AppendRowsRequest(
+                    arrow_rows=bigquery_storage_types.AppendRowsRequest.ArrowData(
+                        rows=bigquery_storage_types.ArrowRecordBatch(
+                            serialized_record_batch=serialized_batch,
+                            row_count=request_batch.num_rows,
+                        )
+                    )
+                )
+                futures.append(stream.send(request))
+
+        # raise error if the last batch went wrong (blocking call)
+        while futures:
+            futures.pop().result()
+    finally:
+        stream.close()
+
+    return True
+
+
 def bigquery_to_records(
     table_id: str, dataset_id: str, project_id: str, limit=10
 ) -> pd.DataFrame:  # pragma: no cover
@@ -482,6 +1215,10 @@ def rasterio_to_bigquery(
     client=None,
     overwrite: bool = False,
     output_quadbin: bool = False,
+    max_workers: int = 1,
+    use_storage_write_api: bool = False,
+    compress: bool = False,
+    io_chunk: int = 1,
 ) -> bool:
     """Write a rasterio-compatible raster file to a BigQuery table.
     Compatible file formats include TIFF and GeoTIFF. See
@@ -515,6 +1252,19 @@ def rasterio_to_bigquery(
     output_quadbin : bool, optional
         Upload the raster to the BigQuery table in a quadbin format (input raster must
         be a GoogleMapsCompatible raster)
+    max_workers : int, optional
+        Number of threads reading raster blocks concurrently, by default 1
+    use_storage_write_api : bool, optional
+        Append the records with the BigQuery Storage Write API instead of load
+        jobs, which avoids the daily quota of load jobs per table (requires
+        google-cloud-bigquery-storage), by default False
+    compress : bool, optional
+        Compress the block values with Blosc2 (Zstd codec), flagged by a
+        ``compression`` entry in the record attrs (requires blosc2), by default
+        False
+    io_chunk : int, optional
+        Read the raster by chunks of ``io_chunk`` x ``io_chunk`` blocks, which
+        makes fewer reads at the cost of more memory per read, by default 1
 
     Returns
     -------
@@ -532,13 +1282,29 @@ def rasterio_to_bigquery(
     """Write a raster file to a BigQuery table."""
     print("Loading raster file to BigQuery...")
 
-    records_gen = rasterio_windows_to_records(
-        file_path, band, input_crs, output_quadbin
-    )
-
     if client is None:  # pragma: no cover
         client = bigquery.Client(project=project_id)
 
+    """Requires rasterio."""
+    if not _has_rasterio:  # pragma: no cover
+        import_error_rasterio()
+
+    # open the raster file once, to both count and read its blocks
+    raster_dataset = rasterio.open(file_path)
+    total_blocks = count_blocks(raster_dataset)
+
+    batches = rasterio_windows_to_record_batches(
+        file_path,
+        band,
+        input_crs,
+        output_quadbin,
+        max_workers,
+        RECORD_BATCH_SIZE if chunk_size is None else chunk_size,
+        compress,
+        io_chunk,
+        raster_dataset,
+    )
+
     try:
         if check_if_bigquery_table_exists(dataset_id, table_id, client):
             if overwrite:
@@ -552,20 +1318,39 @@ def rasterio_to_bigquery(
 
                 if not append_recors:
                     exit()
-        if chunk_size is None:
+        if use_storage_write_api and chunk_size is None:
+            record_batches_to_bigquery_storage(
+                batches, table_id, dataset_id, project_id, client=client
+            )
+        elif use_storage_write_api:
+            from tqdm.auto import tqdm
+
+            with tqdm(total=total_blocks) as pbar:
+
+                def batches_progress():
+                    for batch in batches:
+                        yield batch
+                        pbar.update(batch.num_rows)
+
+                record_batches_to_bigquery_storage(
+                    batches_progress(), table_id, dataset_id, project_id, client=client
+                )
+        elif chunk_size is None:
             job = records_to_bigquery(
-                records_gen, table_id, dataset_id, project_id, client=client
+                pa.Table.from_batches(list(batches)),
+                table_id,
+                dataset_id,
+                project_id,
+                client=client,
             )
             # raise error if job went wrong (blocking call)
             job.result()
         else:
             from tqdm.auto import tqdm
 
-            total_blocks = get_number_of_blocks(file_path)
-
             jobs = []
             with tqdm(total=total_blocks) as pbar:
-                for records in batched(records_gen, chunk_size):
+                for batch in batches:
 
                     try:
                         # raise error if job went wrong (blocking call)
@@ -575,10 +1360,10 @@ def rasterio_to_bigquery(
 
                     jobs.append(
                         records_to_bigquery(
-                            records, table_id, dataset_id, project_id, client=client
+                            batch, table_id, dataset_id, project_id, client=client
                         )
                     )
-                    pbar.update(chunk_size)
+                    pbar.update(batch.num_rows)
 
             # raise error if the last job went wrong (blocking call)
             jobs.pop().result()
@@ -609,6 +1394,9 @@ def rasterio_to_bigquery(
 
         raise IOError("Error uploading to BigQuery: {}".format(e))
 
+    finally:
+        raster_dataset.close()
+
     print("Done.")
     return True
 
@@ -621,7 +1409,18 @@ def get_number_of_blocks(file_path: str) -> int:
         import_error_rasterio()
 
     with rasterio.open(file_path) as raster_dataset:
-        return len(list(raster_dataset.block_windows()))
+        return count_blocks(raster_dataset)
+
+
+def count_blocks(raster_dataset) -> int:
+    """Get the number of blocks of an open rasterio dataset.
+
+    The blocks are counted from the block shape, without building the windows.
+    """
+    block_height, block_width = raster_dataset.block_shapes[0]
+    block_rows = math.ceil(raster_dataset.height / block_height)
+    block_cols = math.ceil(raster_dataset.width / block_width)
+    return block_rows * block_cols
 
 
 def size_mb_of_rasterio_band(file_path: str, band: int = 1) -> int:
@@ -3,7 +3,7 @@ def bigquery_client(load_error=False):
         def __init__(self, load_error):
             self.load_error = load_error
 
-        def load_table_from_dataframe(self, *args, **kwargs):
+        def load_table_from_file(self, *args, **kwargs):
             if load_error:  # pragma: no cover
                 raise Exception
 
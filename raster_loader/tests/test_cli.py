@@ -66,6 +66,80 @@ def test_bigquery_upload_no_table_name(*args, **kwargs):
     assert result.exit_code == 0
 
 
+@patch("raster_loader.io.rasterio_to_bigquery", return_value=None)
+def test_bigquery_upload_max_workers(*args, **kwargs):
+    runner = CliRunner()
+    result = runner.invoke(
+        main,
+        [
+            "bigquery",
+            "upload",
+            "--file_path",
+            f"{tiff}",
+            "--project",
+            "project",
+            "--dataset",
+            "dataset",
+            "--table",
+            "table",
+            "--max_workers",
+            4,
+            "--test",
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Number of Reading Threads: 4" in result.output
+
+
+@patch("raster_loader.io.rasterio_to_bigquery", return_value=None)
+def test_bigquery_upload_io_chunk(*args, **kwargs):
+    runner = CliRunner()
+    result = runner.invoke(
+        main,
+        [
+            "bigquery",
+            "upload",
+            "--file_path",
+            f"{tiff}",
+            "--project",
+            "project",
+            "--dataset",
+            "dataset",
+            "--table",
+            "table",
+            "--io_chunk",
+            4,
+            "--test",
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Blocks Per Read: 4 x 4" in result.output
+
+
+@patch("raster_loader.io.rasterio_to_bigquery", return_value=None)
+def test_bigquery_upload_storage_write_api(rasterio_to_bigquery):
+    runner = CliRunner()
+    result = runner.invoke(
+        main,
+        [
+            "bigquery",
+            "upload",
+            "--file_path",
+            f"{tiff}",
+            "--project",
+            "project",
+            "--dataset",
+            "dataset",
+            "--table",
+            "table",
+            "--use_storage_write_api",
+            "--test",
+        ],
+    )
+    assert result.exit_code == 0
+    assert rasterio_to_bigquery.call_args.kwargs["use_storage_write_api"]
+
+
 @patch(
     "raster_loader.io.bigquery_to_records",
     return_value=pd.DataFrame.from_dict({"col_1": [1, 2], "col_2": ["a", "b"]}),
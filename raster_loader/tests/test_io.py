@@ -148,9 +148,41 @@ def test_record_to_array_invalid_dtype():
     geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
     band = 1
     record = io.array_to_record(arr, transformer, geotransform, crs=crs, band=band)
+    attrs = json.loads(record["attrs"])
+    attrs["dtype"] = "dtype"
 
     with pytest.raises(TypeError):
-        io.record_to_array(record, "band_1_dtype")
+        io.record_to_array(record, attrs=attrs)
+
+
+def test_record_to_array_value_field_with_underscores():
+    arr = np.arange(16, dtype=np.int16).reshape(4, 4)
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    record = io.array_to_record(
+        arr, transformer, geotransform, value_field="my_band_values"
+    )
+
+    arr2 = io.record_to_array(record)
+    assert np.array_equal(arr, arr2)
+    assert arr2.dtype == np.dtype("<i2")
+    assert np.array_equal(io.record_to_array(record, "my_band_values_int16"), arr)
+
+
+def test_record_to_array_without_attrs():
+    arr = np.arange(16, dtype=np.float32).reshape(4, 4)
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    record = io.array_to_record(arr, transformer, geotransform)
+
+    with patch("raster_loader.io.json.loads", wraps=json.loads) as loads:
+        for _ in range(10):
+            arr2 = io.record_to_array(record, "band_1_float32", dtype="float32")
+            assert np.array_equal(arr, arr2)
+        assert loads.call_count == 0
+
+        io.record_to_array(record, "band_1_float32")
+        assert loads.call_count == 1
 
 
 def test_rasterio_to_record():
@@ -232,6 +264,26 @@ def test_rasterio_to_bigquery(*args, **kwargs):
     assert success
 
 
+@patch("raster_loader.io.check_if_bigquery_table_exists", return_value=False)
+def test_rasterio_to_bigquery_opens_file_once(*args, **kwargs):
+    import rasterio
+
+    client = mocks.bigquery_client()
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    with patch("raster_loader.io.rasterio.open", wraps=rasterio.open) as open_:
+        success = io.rasterio_to_bigquery(
+            test_file,
+            project_id="test",
+            dataset_id="test",
+            table_id="test",
+            chunk_size=10,
+            client=client,
+        )
+    assert success
+    assert open_.call_count == 1
+
+
 @patch("raster_loader.io.check_if_bigquery_table_exists", return_value=True)
 @patch("raster_loader.io.delete_bigquery_table", return_value=None)
 def test_rasterio_to_bigquery_overwrite(*args, **kwargs):
@@ -411,3 +463,493 @@ def test_rasterio_to_bigquery_valid_quadbbin_raster(*args, **kwargs):
         output_quadbin=True,
     )
     assert success
+
+
+def test_get_transformer_is_cached():
+    transformer = io.get_transformer("EPSG:3857", "EPSG:4326")
+    assert io.get_transformer("EPSG:3857", "EPSG:4326") is transformer
+
+    lon, lat = transformer.transform(0.0, 0.0)
+    assert lon == pytest.approx(0.0)
+    assert lat == pytest.approx(0.0)
+
+
+def test_array_to_record_reprojected_corners():
+    arr = np.zeros((256, 256), dtype=np.uint8)
+    transformer = io.get_transformer("EPSG:3857", "EPSG:4326")
+    geotransform = Affine.from_gdal(-2e6, 1000.0, 0.0, 2e6, 0.0, -1000.0)
+    record = io.array_to_record(
+        arr, transformer, geotransform, row_off=256, col_off=512, crs="EPSG:3857"
+    )
+
+    corners = {
+        "NW": (512, 256),
+        "NE": (768, 256),
+        "SE": (768, 512),
+        "SW": (512, 512),
+    }
+    for corner, (col, row) in corners.items():
+        lon, lat = transformer.transform(*(geotransform * (col, row)))
+        assert record[f"lon_{corner}"] == pytest.approx(lon)
+        assert record[f"lat_{corner}"] == pytest.approx(lat)
+
+
+def test_blocks_corners():
+    transformer = io.get_transformer("EPSG:3857", "EPSG:4326")
+    geotransform = Affine.from_gdal(-2e6, 1000.0, 0.0, 2e6, 0.0, -1000.0)
+    row_offs, col_offs, heights, widths = [0, 256], [0, 512], [256, 100], [256, 50]
+
+    lons, lats = io.blocks_corners(
+        transformer, geotransform, row_offs, col_offs, heights, widths
+    )
+    assert lons.shape == lats.shape == (2, 4)
+
+    for i in range(2):
+        record = io.array_to_record(
+            np.zeros((heights[i], widths[i])),
+            transformer,
+            geotransform,
+            row_off=row_offs[i],
+            col_off=col_offs[i],
+        )
+        for j, corner in enumerate(["NW", "NE", "SE", "SW"]):
+            assert record[f"lon_{corner}"] == lons[i, j]
+            assert record[f"lat_{corner}"] == lats[i, j]
+
+
+def test_records_to_record_batch():
+    import pyarrow as pa
+
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    arr = np.arange(16, dtype=np.uint16).reshape(4, 4)
+    records = [
+        io.array_to_record(arr, transformer, geotransform, row_off=4 * i)
+        for i in range(3)
+    ]
+
+    batch = io.records_to_record_batch(records)
+
+    assert batch.num_rows == 3
+    assert batch.schema.names == list(records[0].keys())
+    assert batch.schema.field("lat_NW").type == pa.float64()
+    assert batch.schema.field("block_height").type == pa.int64()
+    assert batch.schema.field("attrs").type == pa.string()
+    assert batch.schema.field("band_1_uint16").type == pa.large_binary()
+
+    for record, row in zip(records, batch.to_pylist()):
+        assert row == record
+
+    # other columns have their type inferred
+    for record in records:
+        record["label"] = "block"
+    batch = io.records_to_record_batch(records)
+    assert batch.schema.field("label").type == pa.string()
+    assert batch.schema.field("band_1_uint16").type == pa.large_binary()
+
+    assert io.records_to_record_batch([]).num_rows == 0
+
+
+def test_records_to_bigquery_uses_parquet():
+    from unittest.mock import MagicMock
+    from google.cloud import bigquery
+    import pyarrow.parquet as pq
+
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    records = [io.array_to_record(np.zeros((4, 4)), transformer, geotransform)]
+
+    client = MagicMock()
+    io.records_to_bigquery(records, "table", "dataset", "project", client=client)
+
+    args, kwargs = client.load_table_from_file.call_args
+    assert args[1] == "project.dataset.table"
+    assert kwargs["rewind"]
+    assert pq.read_table(args[0]).to_pylist() == records
+    assert kwargs["job_config"].source_format == bigquery.SourceFormat.PARQUET
+    assert kwargs["job_config"].clustering_fields is None
+
+
+def test_records_to_bigquery_no_records():
+    from unittest.mock import MagicMock
+    import pyarrow.parquet as pq
+
+    client = MagicMock()
+    io.records_to_bigquery([], "table", "dataset", "project", client=client)
+
+    args, _ = client.load_table_from_file.call_args
+    assert pq.read_table(args[0]).num_rows == 0
+
+
+def test_array_to_record_copies_values():
+    import pickle
+
+    arr = np.zeros((4, 4), dtype=np.int16)
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    record = io.array_to_record(arr, transformer, geotransform)
+
+    assert isinstance(record["band_1_int16"], bytes)
+    arr[:] = -1
+    assert np.array_equal(io.record_to_array(record), np.zeros((4, 4)))
+    assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_array_to_buffer():
+    arr = np.arange(12, dtype="<i4").reshape(3, 4)
+    buffer = io.array_to_buffer(arr)
+    assert buffer == arr.tobytes()
+    assert np.shares_memory(np.frombuffer(buffer, dtype="<i4"), arr)
+
+    # big endian and non-contiguous arrays are stored as contiguous little endian
+    arr_be = arr.astype(">i4")[:, ::2]
+    buffer = io.array_to_buffer(arr_be)
+    assert buffer == np.ascontiguousarray(arr[:, ::2]).tobytes()
+
+
+def test_record_to_array_copy():
+    arr = np.linspace(0, 100, 18 * 36).reshape(18, 36)
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    record = io.array_to_record(arr, transformer, geotransform)
+    record["band_1_float64"] = bytes(record["band_1_float64"])
+
+    view = io.record_to_array(record)
+    assert not view.flags.writeable
+
+    arr2 = io.record_to_array(record, copy=True)
+    assert arr2.flags.writeable
+    arr2[0, 0] = -1
+    assert view[0, 0] == arr[0, 0]
+
+
+def test_read_windows_max_workers():
+    import rasterio
+
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    with rasterio.open(test_file) as src:
+        windows = [window for _, window in src.block_windows()]
+        serial = list(io.read_windows(src, 1, windows))
+        threaded = list(io.read_windows(src, 1, iter(windows), max_workers=4))
+
+    assert len(serial) == len(threaded) == len(windows)
+    for arr, arr2 in zip(serial, threaded):
+        assert np.array_equal(arr, arr2)
+
+
+@patch("raster_loader.io.check_if_bigquery_table_exists", return_value=False)
+def test_rasterio_to_bigquery_with_max_workers(*args, **kwargs):
+    client = mocks.bigquery_client()
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    success = io.rasterio_to_bigquery(
+        test_file,
+        project_id="test",
+        dataset_id="test",
+        table_id="test",
+        client=client,
+        chunk_size=10,
+        max_workers=4,
+    )
+    assert success
+
+
+def test_attrs_template():
+    gdal_transform = (-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    template = io.attrs_template(
+        1, "band_1_float64", "float64", "EPSG:4326", gdal_transform
+    )
+    assert (
+        io.attrs_template(1, "band_1_float64", "float64", "EPSG:4326", gdal_transform)
+        is template
+    )
+
+    expected_attrs = {
+        "band": 1,
+        "value_field": "band_1_float64",
+        "dtype": "float64",
+        "crs": "EPSG:4326",
+        "gdal_transform": gdal_transform,
+        "row_off": 256,
+        "col_off": 512,
+    }
+    assert template % (256, 512) == json.dumps(expected_attrs)
+
+
+def test_attrs_template_escapes_percent():
+    gdal_transform = (-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    crs = 'LOCAL_CS["100%"]'
+    template = io.attrs_template(1, "band_1_%d", "float64", crs, gdal_transform)
+
+    attrs = json.loads(template % (256, 512))
+    assert attrs["crs"] == crs
+    assert attrs["value_field"] == "band_1_%d"
+    assert (attrs["row_off"], attrs["col_off"]) == (256, 512)
+
+
+def test_split_record_batch():
+    import pyarrow as pa
+
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array([b"x" * 100] * 10, type=pa.large_binary())], names=["band_1"]
+    )
+
+    assert list(io.split_record_batch(batch, batch.nbytes)) == [batch]
+
+    slices = list(io.split_record_batch(batch, 350))
+    assert [s.num_rows for s in slices] == [3, 3, 3, 1]
+    assert all(s.nbytes <= 350 for s in slices)
+    assert pa.Table.from_batches(slices).equals(pa.Table.from_batches([batch]))
+
+    with pytest.raises(ValueError):
+        list(io.split_record_batch(batch, 10))
+
+
+def test_split_record_batch_uneven_rows():
+    import pyarrow as pa
+
+    values = [b"x" * 1024] * 500 + [b"x" * 500 * 1024] * 50
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(range(len(values))), pa.array(values, type=pa.large_binary())],
+        names=["block", "band_1"],
+    )
+    max_bytes = io.STORAGE_WRITE_MAX_REQUEST_BYTES
+
+    slices = list(io.split_record_batch(batch, max_bytes))
+    assert len(slices) > 1
+    assert all(s.nbytes <= max_bytes for s in slices)
+    assert pa.Table.from_batches(slices).equals(pa.Table.from_batches([batch]))
+
+
+@pytest.mark.skipif(
+    not io._has_bigquery_storage, reason="google-cloud-bigquery-storage not installed"
+)
+@patch("raster_loader.io.bigquery_storage_writer.AppendRowsStream")
+def test_record_batches_to_bigquery_storage(AppendRowsStream):
+    from unittest.mock import MagicMock
+
+    import pyarrow as pa
+
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    records = [
+        io.array_to_record(np.zeros((4, 4)), transformer, geotransform, row_off=i)
+        for i in range(5)
+    ]
+    batches = [
+        io.records_to_record_batch(records[:3]),
+        io.records_to_record_batch(records[3:]),
+    ]
+
+    client = MagicMock()
+    write_client = MagicMock()
+    write_client.table_path.return_value = "projects/p/datasets/d/tables/t"
+
+    success = io.record_batches_to_bigquery_storage(
+        batches, "t", "d", "p", client=client, write_client=write_client
+    )
+    assert success
+
+    table = client.create_table.call_args.args[0]
+    assert table.schema[0].name == "lat_NW"
+    assert table.schema[0].field_type == "FLOAT64"
+    assert table.schema[-1].name == "band_1_float64"
+    assert table.schema[-1].field_type == "BYTES"
+    assert table.clustering_fields is None
+
+    template = AppendRowsStream.call_args.args[1]
+    assert template.write_stream == "projects/p/datasets/d/tables/t/streams/_default"
+
+    stream = AppendRowsStream.return_value
+    requests = [call.args[0] for call in stream.send.call_args_list]
+    assert [r.arrow_rows.rows.row_count for r in requests] == [3, 2]
+
+    batch = pa.ipc.read_record_batch(
+        requests[0].arrow_rows.rows.serialized_record_batch, batches[0].schema
+    )
+    assert batch.equals(batches[0])
+    stream.close.assert_called_once()
+
+
+@patch("raster_loader.io.record_batches_to_bigquery_storage", return_value=True)
+@patch("raster_loader.io.check_if_bigquery_table_exists", return_value=False)
+def test_rasterio_to_bigquery_with_storage_write_api(_, storage_mock):
+    client = mocks.bigquery_client()
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    for chunk_size in [None, 25]:
+        num_rows = []
+        storage_mock.side_effect = lambda batches, *args, **kwargs: num_rows.extend(
+            batch.num_rows for batch in batches
+        )
+
+        success = io.rasterio_to_bigquery(
+            test_file,
+            project_id="test",
+            dataset_id="test",
+            table_id="test",
+            client=client,
+            chunk_size=chunk_size,
+            use_storage_write_api=True,
+        )
+        assert success
+        assert sum(num_rows) == io.get_number_of_blocks(test_file)
+
+
+def test_get_number_of_blocks():
+    import rasterio
+
+    for fixture in ["mosaic.tif", "quadbin_raster.tif"]:
+        test_file = os.path.join(fixtures_dir, fixture)
+
+        with rasterio.open(test_file) as src:
+            expected = len(list(src.block_windows()))
+
+        assert io.get_number_of_blocks(test_file) == expected
+
+
+def test_rasterio_windows_to_record_batches():
+    import rasterio
+
+    test_file = os.path.join(fixtures_dir, "mosaic_wm.tif")
+    batches = list(io.rasterio_windows_to_record_batches(test_file, batch_size=40))
+
+    assert [batch.num_rows for batch in batches] == [40, 40, 10]
+
+    rows = [row for batch in batches for row in batch.to_pylist()]
+    with rasterio.open(test_file) as src:
+        transformer = io.get_transformer(src.crs.to_string())
+        for row, (_, window) in zip(rows, src.block_windows()):
+            record = io.array_to_record(
+                src.read(1, window=window),
+                transformer,
+                src.transform,
+                window.row_off,
+                window.col_off,
+                crs=src.crs.to_string(),
+            )
+            assert row == record
+
+
+def test_blocks_grid():
+    import rasterio
+
+    for fixture in ["mosaic.tif", "quadbin_raster.tif"]:
+        with rasterio.open(os.path.join(fixtures_dir, fixture)) as src:
+            windows = [window for _, window in src.block_windows()]
+            row_offs, col_offs, heights, widths = io.blocks_grid(src)
+
+        assert row_offs.tolist() == [window.row_off for window in windows]
+        assert col_offs.tolist() == [window.col_off for window in windows]
+        assert heights.tolist() == [window.height for window in windows]
+        assert widths.tolist() == [window.width for window in windows]
+
+
+def test_read_chunks():
+    import rasterio
+
+    for fixture in ["mosaic.tif", "quadbin_raster.tif"]:
+        with rasterio.open(os.path.join(fixtures_dir, fixture)) as src:
+            grid = io.blocks_grid(src, io_chunk=3)
+            arrays = list(io.read_chunks(src, 1, io_chunk=3))
+
+            # every block once, grouped by chunks of 3 x 3 blocks
+            windows = sorted((w.row_off, w.col_off) for _, w in src.block_windows())
+            assert sorted(zip(grid[0].tolist(), grid[1].tolist())) == windows
+            assert len(arrays) == len(windows)
+
+            for row_off, col_off, height, width, arr in zip(*grid, arrays):
+                window = io.Window(col_off, row_off, width, height)
+                assert np.array_equal(arr, src.read(1, window=window))
+
+
+def test_rasterio_windows_to_records_io_chunk():
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    records = list(io.rasterio_windows_to_records(test_file))
+    chunked_records = list(io.rasterio_windows_to_records(test_file, io_chunk=4))
+
+    def key(record):
+        attrs = json.loads(record["attrs"])
+        return attrs["row_off"], attrs["col_off"]
+
+    assert sorted(records, key=key) == sorted(chunked_records, key=key)
+
+
+def test_records_to_arrays():
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+    records = list(io.rasterio_windows_to_records(test_file))
+
+    with patch("raster_loader.io.json.loads", wraps=json.loads) as loads:
+        arrays = io.records_to_arrays(records)
+    assert loads.call_count == 1
+
+    assert len(arrays) == len(records)
+    for record, arr in zip(records, arrays):
+        assert np.array_equal(arr, io.record_to_array(record))
+
+    assert io.records_to_arrays([]) == []
+
+
+def test_read_windows_into_blocks_buffers():
+    import rasterio
+
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+
+    with rasterio.open(test_file) as src:
+        windows = [window for _, window in src.block_windows()]
+        row_offs, col_offs, heights, widths = io.blocks_grid(src)
+        outs = list(
+            io.blocks_buffers(heights, widths, src.block_shapes[0], src.dtypes[0], 32)
+        )
+        arrays = list(io.read_windows(src, 1, windows, outs=iter(outs)))
+
+        for window, out, arr in zip(windows, outs, arrays):
+            assert np.array_equal(arr, src.read(1, window=window))
+            if (window.height, window.width) == src.block_shapes[0]:
+                assert arr is out
+                assert arr.flags.c_contiguous
+            else:
+                assert out is None
+
+    # one buffer per batch of blocks
+    assert outs[0].base is outs[31].base
+    assert outs[0].base is not outs[32].base
+
+
+@pytest.mark.skipif(not io._has_blosc2, reason="blosc2 not installed")
+def test_record_to_array_compressed():
+    arr = np.linspace(0, 100, 180 * 360, dtype=np.float32).reshape(180, 360)
+    transformer = io.get_transformer("EPSG:4326", "EPSG:4326")
+    geotransform = Affine.from_gdal(-180.0, 1.0, 0.0, 90.0, 0.0, -1.0)
+    record = io.array_to_record(arr, transformer, geotransform, compress=True)
+
+    assert json.loads(record["attrs"])["compression"] == "blosc2-zstd"
+    assert len(record["band_1_float32"]) < arr.nbytes
+
+    assert np.array_equal(io.record_to_array(record), arr)
+    assert np.array_equal(
+        io.record_to_array(
+            record, "band_1_float32", dtype="float32", compression="blosc2-zstd"
+        ),
+        arr,
+    )
+
+    attrs = json.loads(record["attrs"])
+    attrs["compression"] = "gzip"
+    with pytest.raises(ValueError):
+        io.record_to_array(record, attrs=attrs)
+
+
+@pytest.mark.skipif(not io._has_blosc2, reason="blosc2 not installed")
+def test_rasterio_windows_to_records_compressed():
+    test_file = os.path.join(fixtures_dir, "mosaic.tif")
+    records = list(io.rasterio_windows_to_records(test_file))
+    compressed = list(io.rasterio_windows_to_records(test_file, compress=True))
+
+    assert "compression" not in json.loads(records[0]["attrs"])
+    for arr, arr2 in zip(
+        io.records_to_arrays(records), io.records_to_arrays(compressed)
+    ):
+        assert np.array_equal(arr, arr2)